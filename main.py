@@ -1,50 +1,46 @@
 import os
 import sys
 import json
+import struct
+import time
+from queue import Queue, Full
+from concurrent.futures import ThreadPoolExecutor, wait
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QFileDialog, QMessageBox,
     QVBoxLayout, QGridLayout, QGroupBox, QWidget, QProgressBar, QStatusBar
 )
-from PySide6.QtGui import QIcon, QDragEnterEvent, QDropEvent
-from PySide6.QtCore import Qt, QSettings
-from zipfile import ZipFile, BadZipFile
-from os import makedirs, remove, rmdir, walk
-from os.path import (join, splitext, exists, basename, dirname,
-                     abspath, normpath, commonprefix)
+from PySide6.QtGui import QIcon, QCloseEvent, QDragEnterEvent, QDropEvent
+from PySide6.QtCore import Qt, QSettings, QThread, Signal
+from zipfile import ZipFile, ZipInfo, BadZipFile, ZIP_DEFLATED, ZIP_STORED
+from os.path import join, splitext, basename, dirname, abspath
+
+# 优先使用ISA-L加速的DEFLATE实现（pip install isal），未安装时回退到标准库zlib
+try:
+    from isal import isal_zlib as zlib
+    HAS_ISAL = True
+except ImportError:
+    import zlib
+    HAS_ISAL = False
 
 
 # ======================== 核心功能函数 ========================
-def custom_relpath(path, start):
-    """
-    自定义相对路径计算方法，处理跨平台路径差异
-    参数：
-        path: 目标路径
-        start: 起始路径
-    返回：
-        标准化的相对路径
-    """
-    # 规范化路径并转换为绝对路径
-    path = abspath(normpath(path))
-    start = abspath(normpath(start))
-    
-    # 如果起始路径不在目标路径中，直接返回原路径
-    if start not in path:
-        return path
-    
-    # 计算公共前缀
-    common = commonprefix([path, start])
-    rel_path = path[len(common):].lstrip(os.sep)
-    
-    # 处理路径中的特殊符号
-    parts = rel_path.split(os.sep)
-    rel = []
-    for part in parts:
-        if part == '..':
-            if rel:
-                rel.pop()
-        elif part != '.':
-            rel.append(part)
-    return os.sep.join(rel)
+# 打包项目中Scratch资源在ZIP内的路径前缀
+APP_PREFIX = "packaged-project/resources/app/"
+# 读写ZIP文件时使用的缓冲区大小
+IO_BUFFER_SIZE = 1 << 20
+# 压缩未压缩条目时使用的DEFLATE级别，兼顾速度与体积（ISA-L只支持0~3级）
+COMPRESS_LEVEL = zlib.ISAL_DEFAULT_COMPRESSION if HAS_ISAL else 6
+# 打包进度的最短刷新间隔（秒），约30Hz
+PROGRESS_INTERVAL = 1 / 30
+# 读取线程等待写入队列时检查写入线程状态的间隔（秒）
+QUEUE_POLL_INTERVAL = 0.1
+# ZIP本地文件头的签名与固定长度
+LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+LOCAL_HEADER_SIZE = 30
+# 通用标志位中的“已加密”位
+ENCRYPTED_FLAG = 0x01
+# 通用标志位中的“数据描述符”位，直接写入时大小已在文件头中，需要清除
+DATA_DESCRIPTOR_FLAG = 0x08
 
 
 def convert_exe_to_sb3(zip_file_name, output_dir, progress_callback=None):
@@ -61,58 +57,75 @@ def convert_exe_to_sb3(zip_file_name, output_dir, progress_callback=None):
         # 初始化路径参数
         file_name = basename(zip_file_name)
         target_zip_name = join(output_dir, f"{splitext(file_name)[0]}.sb3")
-        temp_dir = join(output_dir, "temp_extract")
-        
-        # 创建临时目录
-        makedirs(temp_dir, exist_ok=True)
         
-        # ----------------- 阶段1：解压ZIP文件 -----------------
-        _update_progress(progress_callback, 10, "正在解压文件...")
+        # ----------------- 阶段1：读取ZIP文件 -----------------
+        _update_progress(progress_callback, 10, "正在读取ZIP文件...")
         
+        # 使用较大的读缓冲区，减少逐条目读取时的系统调用
+        src_file = open(zip_file_name, 'rb', buffering=IO_BUFFER_SIZE)
         try:
-            with ZipFile(zip_file_name, 'r') as zip_ref:
-                zip_ref.extractall(temp_dir)
+            zip_in = ZipFile(src_file, 'r')
         except BadZipFile:
+            src_file.close()
             _update_progress(progress_callback, 0, "错误：无效的ZIP文件格式")
             return False
 
-        # ----------------- 阶段2：验证目录结构 -----------------
-        temp_dir = list(temp_dir)
-        sum = 0
-        for i in temp_dir:
-            if i == '/':
-                temp_dir[sum] = '\\'
-            sum += 1
-        temp = temp_dir
-        temp_dir = ''
-        sum = 0
-        for i in temp:
-            temp_dir += temp[sum]
-            sum += 1
-        app_dir = join(temp_dir, "packaged-project", "resources", "app")
-        app_dir += '\\'
-        if not exists(app_dir):
-            _update_progress(progress_callback, 0, f"错误：缺少资源目录 {app_dir}")
-            return False
-
-        # ----------------- 阶段3：创建SB3文件 -----------------
-        _update_progress(progress_callback, 50, "正在打包SB3文件...")
-        
-        try:
-            with ZipFile(target_zip_name, 'w') as new_zip:
-                for root, dirs, files in walk(app_dir):
-                    for file in files:
-                        src_path = join(root, file)
-                        # 计算相对路径并标准化
-                        rel_path = join(custom_relpath(root, app_dir), file)
-                        new_zip.write(src_path, arcname=rel_path)
-        except Exception as e:
-            _update_progress(progress_callback, 0, f"写入错误：{str(e)}")
-            return False
-
-        # ----------------- 阶段4：清理临时文件 -----------------
-        _update_progress(progress_callback, 80, "正在清理临时文件...")
-        _cleanup_temp_dir(temp_dir)
+        with src_file, zip_in:
+            # ----------------- 阶段2：验证目录结构 -----------------
+            # 只保留资源目录下的文件，其余内容无需打包；
+            # 条目名称去掉固定前缀即为SB3内的相对路径
+            prefix_len = len(APP_PREFIX)
+            entries = []
+            for info in zip_in.infolist():
+                # 部分Windows压缩工具用反斜杠分隔路径，ZIP规范要求使用'/'
+                name = info.filename.replace('\\', '/')
+                if name.startswith(APP_PREFIX) and not name.endswith('/'):
+                    # 加密条目原样复制后无法被Scratch读取，直接报错
+                    if info.flag_bits & ENCRYPTED_FLAG:
+                        _update_progress(progress_callback, 0,
+                                         f"错误：不支持加密的ZIP文件 {info.filename}")
+                        return False
+                    entries.append((info, name[prefix_len:]))
+            if not entries:
+                _update_progress(progress_callback, 0, f"错误：缺少资源目录 {APP_PREFIX}")
+                return False
+
+            # ----------------- 阶段3：创建SB3文件 -----------------
+            _update_progress(progress_callback, 10, "正在打包SB3文件...")
+            
+            # 先写入临时文件，全部成功后再替换目标文件，
+            # 避免失败时留下不完整的SB3或覆盖之前成功的结果
+            temp_zip_name = target_zip_name + ".tmp"
+            try:
+                workers = os.cpu_count() or 1
+                with ThreadPoolExecutor(max_workers=workers) as pool, \
+                        ThreadPoolExecutor(max_workers=1) as writer_pool, \
+                        open(temp_zip_name, 'wb', buffering=IO_BUFFER_SIZE) as dst_file, \
+                        ZipFile(dst_file, 'w', compression=ZIP_DEFLATED,
+                                allowZip64=True) as zip_out:
+                    # 当前线程读取、线程池压缩、写入线程按顺序写入，三者流水线并行；
+                    # 有界队列限制排队数量，避免整个项目同时驻留内存
+                    results = Queue(maxsize=workers * 2)
+                    writer = writer_pool.submit(
+                        _write_entries, zip_out, results, len(entries), progress_callback)
+                    try:
+                        for info, arcname in entries:
+                            compress_type, data = _load_entry(zip_in, info)
+                            item = (info, arcname, pool.submit(_pack_entry, compress_type, data))
+                            if not _put_result(results, item, writer):
+                                break  # 写入线程已结束，错误由writer.result()抛出
+                    finally:
+                        _put_result(results, None, writer)
+                        wait([writer])  # 关闭输出ZIP前必须等写入线程结束
+                    writer.result()
+                os.replace(temp_zip_name, target_zip_name)
+            except Exception as e:
+                try:
+                    os.remove(temp_zip_name)
+                except OSError:
+                    pass
+                _update_progress(progress_callback, 0, f"写入错误：{str(e)}")
+                return False
 
         _update_progress(progress_callback, 100, "转换完成！")
         return True
@@ -122,6 +135,142 @@ def convert_exe_to_sb3(zip_file_name, output_dir, progress_callback=None):
         return False
 
 
+def _read_raw_entry(zip_in, info):
+    """
+    读取条目的原始压缩数据，不做解压
+    参数：
+        zip_in: 已打开的输入ZIP
+        info: 输入ZIP中的条目信息
+    返回：
+        bytes: 条目在ZIP中存储的原始数据
+    """
+    # 从本地文件头中读取文件名和扩展字段长度，定位压缩数据的起始位置
+    src = zip_in.fp
+    src.seek(info.header_offset)
+    header = src.read(LOCAL_HEADER_SIZE)
+    if len(header) != LOCAL_HEADER_SIZE or header[:4] != LOCAL_HEADER_SIGNATURE:
+        raise BadZipFile(f"本地文件头损坏：{info.filename}")
+    name_len, extra_len = struct.unpack("<HH", header[26:30])
+    src.seek(name_len + extra_len, os.SEEK_CUR)
+
+    data = src.read(info.compress_size)
+    if len(data) != info.compress_size:
+        raise BadZipFile(f"文件数据被截断：{info.filename}")
+    return data
+
+
+def _load_entry(zip_in, info):
+    """
+    读取条目数据：STORED和DEFLATE条目读取原始数据，其他压缩方式解压后返回
+    参数：
+        zip_in: 已打开的输入ZIP
+        info: 输入ZIP中的条目信息
+    返回：
+        (data的压缩方式, 条目数据)
+    """
+    if info.compress_type in (ZIP_STORED, ZIP_DEFLATED):
+        return info.compress_type, _read_raw_entry(zip_in, info)
+    # Scratch只能读取STORED和DEFLATE条目，LZMA、BZIP2等需要解压后重新压缩
+    return ZIP_STORED, zip_in.read(info)
+
+
+def _pack_entry(compress_type, data):
+    """
+    在工作线程中处理单个条目：未压缩的条目用DEFLATE压缩，DEFLATE条目原样返回
+    参数：
+        compress_type: data的压缩方式
+        data: 条目数据
+    返回：
+        (压缩方式, 写入SB3的数据)
+    """
+    if compress_type == ZIP_DEFLATED:
+        return compress_type, data
+
+    # zlib在压缩时会释放GIL，多个条目可以在线程池中并行压缩
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush()
+    if len(packed) >= len(data):  # 图片等已压缩过的资源保持原样
+        return ZIP_STORED, data
+    return ZIP_DEFLATED, packed
+
+
+def _put_result(results, item, writer):
+    """
+    向写入队列放入数据，写入线程出错退出后放弃等待
+    参数：
+        results: 写入队列
+        item: 放入的数据
+        writer: 写入线程的Future
+    返回：
+        bool: 是否成功放入
+    """
+    while not writer.done():
+        try:
+            results.put(item, timeout=QUEUE_POLL_INTERVAL)
+            return True
+        except Full:
+            pass
+    return False
+
+
+def _write_entries(zip_out, results, total, progress_callback=None):
+    """
+    写入线程：按提交顺序取出处理结果写入SB3，取到None时结束；
+    出错时立即抛出异常退出，读取线程据此停止读取
+    参数：
+        zip_out: 已打开的输出ZIP
+        results: 存放(条目信息, SB3内名称, 处理结果Future)的队列
+        total: 条目总数，用于计算进度
+        progress_callback: 进度回调函数
+    """
+    written = 0
+    last_report = 0.0
+    while (item := results.get()) is not None:
+        info, arcname, future = item
+        _write_raw_entry(zip_out, info, arcname, *future.result())
+        # 打包阶段占进度条的10%~100%；限制刷新频率，避免大量小文件刷屏界面事件
+        written += 1
+        now = time.monotonic()
+        if written == total or now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            _update_progress(progress_callback, 10 + written * 90 // total,
+                             f"正在打包SB3文件...（{written}/{total}）")
+
+
+def _write_raw_entry(zip_out, info, arcname, compress_type, data):
+    """
+    将已处理好的数据直接写入输出ZIP
+    参数：
+        zip_out: 已打开的输出ZIP
+        info: 输入ZIP中的条目信息
+        arcname: 条目在输出ZIP中的名称
+        compress_type: data对应的压缩方式
+        data: 写入的（压缩）数据
+    """
+    # CRC、大小和文件属性直接沿用输入ZIP中央目录的记录，
+    # 文件头一次写好，不需要像zipfile.open那样写完数据后回填
+    new_info = ZipInfo(arcname, info.date_time)
+    new_info.compress_type = compress_type
+    new_info.flag_bits = info.flag_bits & ~DATA_DESCRIPTOR_FLAG
+    new_info.CRC = info.CRC
+    new_info.file_size = info.file_size
+    new_info.compress_size = len(data)
+    new_info.create_system = info.create_system
+    new_info.external_attr = info.external_attr
+
+    # 写入位置始终在上一条目之后，不做seek，以免清空写缓冲区
+    dst = zip_out.fp
+    new_info.header_offset = dst.tell()
+    zip_out._writecheck(new_info)
+    zip_out._didModify = True
+    dst.write(new_info.FileHeader())
+    dst.write(data)
+
+    zip_out.start_dir = dst.tell()
+    zip_out.filelist.append(new_info)
+    zip_out.NameToInfo[arcname] = new_info
+
+
 def _update_progress(callback, value, message):
     """安全更新进度"""
     if callback:
@@ -131,20 +280,58 @@ def _update_progress(callback, value, message):
             pass
 
 
-def _cleanup_temp_dir(temp_dir):
-    """安全删除临时目录"""
-    try:
-        for root, dirs, files in walk(temp_dir, topdown=False):
-            for name in files:
-                os.remove(join(root, name))
-            for name in dirs:
-                os.rmdir(join(root, name))
-        os.rmdir(temp_dir)
-    except Exception as e:
-        print(f"清理临时目录失败：{str(e)}")
+def _is_zip(path):
+    """判断路径是否为ZIP文件（只检查扩展名）"""
+    return splitext(path)[1].lower() == ".zip"
 
 
 # ======================== GUI界面类 ========================
+# 按钮背景色，键为按钮的objectName
+BUTTON_COLORS = {
+    "history": "#8e44ad",
+    "input": "#27ae60",
+    "output": "#2980b9",
+    "convert": "#e67e22",
+    "about": "#9b59b6",
+}
+
+# 全局样式表：按钮共用基础样式，按objectName区分颜色，只需解析一次；
+# 选择器限定objectName，避免影响对话框中的按钮
+APP_QSS = ", ".join(f"QPushButton#{name}" for name in BUTTON_COLORS) + """ {
+    color: white;
+    border: none;
+    border-radius: 5px;
+    padding: 10px;
+    font-size: 14px;
+}
+""" + "".join(
+    f"QPushButton#{name} {{ background-color: {color}; }}\n"
+    f"QPushButton#{name}:hover {{ background-color: {color}90; }}\n"
+    for name, color in BUTTON_COLORS.items()
+)
+
+
+class ConversionWorker(QThread):
+    """后台转换线程，避免转换过程阻塞界面"""
+
+    progress = Signal(int, str)
+    finished_ok = Signal(bool)
+
+    def __init__(self, zip_file_name, output_dir, parent=None):
+        super().__init__(parent)
+        self.zip_file_name = zip_file_name
+        self.output_dir = output_dir
+
+    def run(self):
+        """在后台线程执行转换，进度通过信号回传界面线程"""
+        success = convert_exe_to_sb3(
+            self.zip_file_name,
+            self.output_dir,
+            self.progress.emit
+        )
+        self.finished_ok.emit(success)
+
+
 class MainWindow(QMainWindow):
     """主窗口类，处理界面交互"""
     
@@ -154,9 +341,18 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Delicious")
         self.setFixedSize(420, 350)  # 固定窗口尺寸
         self.setWindowIcon(QIcon(self._resource_path("icon.png")))
+        QApplication.instance().setStyleSheet(APP_QSS)
         
         # 初始化设置存储
         self.settings = QSettings("Bilibili", "EXE2SB3")
+        # 历史记录只在启动时解析一次，之后读写都使用缓存
+        self._history = json.loads(self.settings.value("history", "{}") or "{}")
+
+        # 后台转换线程
+        self.worker = None
+
+        # 已通过完整校验的输入文件，避免转换时重复校验
+        self._input_validated_path = None
         
         # 初始化界面组件
         self._init_ui()
@@ -183,7 +379,7 @@ class MainWindow(QMainWindow):
         
         # 历史记录按钮
         self.history_button = self._create_button(
-            "历史记录", "#8e44ad", self._show_history)
+            "历史记录", "history", self._show_history)
         main_layout.addWidget(self.history_button)
 
         # 进度条
@@ -205,14 +401,14 @@ class MainWindow(QMainWindow):
 
         # 输入文件组件
         self.input_button = self._create_button(
-            "选择 ZIP 文件", "#27ae60", self._select_input_file)
+            "选择 ZIP 文件", "input", self._select_input_file)
         self.input_file_label = self._create_label("未选择文件", "#34495e")
         grid.addWidget(self.input_button, 0, 0)
         grid.addWidget(self.input_file_label, 0, 1)
 
         # 输出目录组件
         self.output_button = self._create_button(
-            "选择输出目录", "#2980b9", self._select_output_dir)
+            "选择输出目录", "output", self._select_output_dir)
         self.output_dir_label = self._create_label("未选择目录", "#34495e")
         grid.addWidget(self.output_button, 1, 0)
         grid.addWidget(self.output_dir_label, 1, 1)
@@ -243,35 +439,23 @@ class MainWindow(QMainWindow):
         
         # 转换按钮
         self.convert_button = self._create_button(
-            "开始转换", "#e67e22", self._perform_conversion)
+            "开始转换", "convert", self._perform_conversion)
         self.convert_button.setFixedHeight(40)
         button_layout.addWidget(self.convert_button, 0, 0)
 
         # 关于按钮
         self.about_button = self._create_button(
-            "关于作者", "#9b59b6", self._show_author_info)
+            "关于作者", "about", self._show_author_info)
         self.about_button.setFixedHeight(40)
         button_layout.addWidget(self.about_button, 0, 1)
 
         layout.addLayout(button_layout)
 
     # ----------------- 组件创建工具 -----------------
-    def _create_button(self, text, color, callback):
-        """创建风格化按钮"""
+    def _create_button(self, text, name, callback):
+        """创建风格化按钮，样式由全局样式表按objectName匹配"""
         btn = QPushButton(text)
-        btn.setStyleSheet(f"""
-            QPushButton {{
-                background-color: {color};
-                color: white;
-                border: none;
-                border-radius: 5px;
-                padding: 10px;
-                font-size: 14px;
-            }}
-            QPushButton:hover {{
-                background-color: {color}90;
-            }}
-        """)
+        btn.setObjectName(name)
         btn.clicked.connect(callback)
         return btn
 
@@ -288,11 +472,17 @@ class MainWindow(QMainWindow):
         if event.mimeData().hasUrls():
             event.acceptProposedAction()
 
+    def closeEvent(self, event: QCloseEvent):
+        """关闭窗口前等待转换线程结束"""
+        if self.worker and self.worker.isRunning():
+            self.worker.wait()
+        super().closeEvent(event)
+
     def dropEvent(self, event: QDropEvent):
         """拖放释放事件处理"""
         for url in event.mimeData().urls():
             file_path = url.toLocalFile()
-            if file_path.lower().endswith(".zip"):
+            if _is_zip(file_path):
                 self.input_file_path = file_path
                 self.input_file_label.setText(basename(file_path))
                 self._save_history()
@@ -306,6 +496,7 @@ class MainWindow(QMainWindow):
             self, "选择 ZIP 文件", default_dir, "ZIP 文件 (*.zip)")
         if path and self._validate_zip(path):
             self.input_file_path = path
+            self._input_validated_path = path
             self.input_file_label.setText(basename(path))
             self.settings.setValue("last_input_dir", dirname(path))
             self._save_history()
@@ -328,34 +519,49 @@ class MainWindow(QMainWindow):
 
         self.progress_bar.setValue(0)
         self.status_bar.showMessage("正在转换...")
+        self.convert_button.setEnabled(False)  # 防止重复启动转换
 
-        def progress_callback(value, message):
-            self.progress_bar.setValue(value)
-            self.status_bar.showMessage(message)
-
-        success = convert_exe_to_sb3(
+        self.worker = ConversionWorker(
             self.input_file_path,
             self.output_dir_path,
-            progress_callback
+            self
         )
-
+        self.worker.progress.connect(self._on_conversion_progress)
+        self.worker.finished_ok.connect(self._on_conversion_finished)
+        self.worker.finished.connect(self._on_worker_finished)
+        self.worker.start()
+
+    def _on_conversion_progress(self, value, message):
+        """更新转换进度"""
+        self.progress_bar.setValue(value)
+        self.status_bar.showMessage(message)
+
+    def _on_conversion_finished(self, success):
+        """转换结束后提示结果"""
         if success:
             QMessageBox.information(self, "完成", "文件转换成功！")
         else:
             QMessageBox.critical(self, "错误", "转换失败，请检查：\n1. 文件是否为合法Scratch项目\n2. 输出目录写入权限")
 
+    def _on_worker_finished(self):
+        """线程退出后释放转换线程对象并恢复按钮"""
+        self.worker.deleteLater()
+        self.worker = None
+        self.convert_button.setEnabled(True)
+
     # ----------------- 历史记录处理 -----------------
     def _save_history(self):
         """保存历史记录"""
-        history = {
-            "input": self.input_file_path,
-            "output": self.output_dir_path
-        }
-        self.settings.setValue("history", json.dumps(history))
+        self._history.update(
+            input=self.input_file_path,
+            output=self.output_dir_path
+        )
+        self.settings.setValue(
+            "history", json.dumps(self._history, separators=(',', ':')))
 
     def _load_history(self):
         """加载历史记录"""
-        history = json.loads(self.settings.value("history", "{}"))
+        history = self._history
         if self._validate_path(history.get("input")):
             self.input_file_path = history["input"]
             self.input_file_label.setText(basename(history["input"]))
@@ -369,8 +575,11 @@ class MainWindow(QMainWindow):
         if not all([self.input_file_path, self.output_dir_path]):
             QMessageBox.warning(self, "警告", "请先选择文件和输出目录！")
             return False
-        if not self._validate_zip(self.input_file_path):
+        # 选择文件时已校验过的路径无需再次校验
+        if (self.input_file_path != self._input_validated_path
+                and not self._validate_zip(self.input_file_path)):
             return False
+        self._input_validated_path = self.input_file_path
         if not os.access(self.output_dir_path, os.W_OK):
             QMessageBox.critical(self, "错误", "输出目录没有写入权限")
             return False
@@ -378,7 +587,7 @@ class MainWindow(QMainWindow):
 
     def _validate_zip(self, path):
         """验证ZIP文件有效性"""
-        if not path.lower().endswith(".zip"):
+        if not _is_zip(path):
             QMessageBox.warning(self, "警告", "请选择ZIP格式文件")
             return False
         if not os.access(path, os.R_OK):
@@ -394,7 +603,7 @@ class MainWindow(QMainWindow):
     # ----------------- 信息展示 -----------------
     def _show_history(self):
         """显示历史记录"""
-        history = json.loads(self.settings.value("history", "{}"))
+        history = self._history
         msg = (
             "最近使用的文件：\n"
             f"输入文件：{history.get('input', '无')}\n"